@@ -1,4 +1,7 @@
+import jax
+import jax.numpy as jnp
 import numpy as np
+from jax.experimental import enable_x64
 
 """ ======================================================================================================= """
 """                                       Filtering                                                         """
@@ -14,10 +17,21 @@ def gaussian_kernel(x, sigma):
     return K
 
 
+@jax.jit
 def product_manifold_kernel(gx, gy, ix, iy, sigma):
-    Kx = gaussian_kernel(gx, sigma)
-    Ky = gaussian_kernel(gy, sigma)
-    K = Kx[:, ix].dot(Ky[:, iy].T)
+    # Only the indexed columns are exponentiated; XLA fuses the gather and
+    # exp so no intermediate N x N kernels are materialised.
+    Kx = jnp.exp(-0.5 * (jnp.take(gx, ix, axis=1, mode="clip") / sigma) ** 2)
+    Ky = jnp.exp(-0.5 * (jnp.take(gy, iy, axis=1, mode="clip") / sigma) ** 2)
+    K = Kx @ Ky.T
+    return K / K.max()
+
+
+@jax.jit
+def indexed_product_manifold_kernel(Kx, Ky, ix, iy):
+    Kx = jnp.take(Kx, ix, axis=1, mode="clip")
+    Ky = jnp.take(Ky, iy, axis=1, mode="clip")
+    K = Kx @ Ky.T
     return K / K.max()
 
 
@@ -27,10 +41,22 @@ def product_manifold_filter_correspondence(
     sigma, gamma, iterations = (
         config[key] for key in ["sigma", "gamma", "iterations"]
     )
-    for _ in range(iterations):
-        P = product_manifold_kernel(gx, gy, i, j, sigma)
-        i, j = assignment_functor(P)
-        sigma *= gamma
+    # jax defaults to single precision; the kernels are kept in double
+    # precision so near-tied assignments match the numpy implementation.
+    with enable_x64():
+        if gamma == 1:
+            # sigma is fixed, so the gaussian kernels only need computing once.
+            Kx, Ky = (jnp.asarray(gaussian_kernel(g, sigma)) for g in (gx, gy))
+        else:
+            gx, gy = jnp.asarray(gx), jnp.asarray(gy)
+        for _ in range(iterations):
+            if gamma == 1:
+                P = indexed_product_manifold_kernel(Kx, Ky, i, j)
+            else:
+                P = product_manifold_kernel(gx, gy, i, j, sigma)
+            P = np.asarray(P)
+            i, j = assignment_functor(P)
+            sigma *= gamma
     return i, j
 
 
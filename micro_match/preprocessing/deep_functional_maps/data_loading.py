@@ -34,6 +34,16 @@ def stripFileType(s):
     return s
 
 
+def metric_file(tfrecords_filename):
+    # Geodesic matrices are kept beside the TFRecord rather than inside it,
+    # stacked into one [num_examples, N, N] array indexed by metric_id.
+    return os.path.splitext(tfrecords_filename)[0] + "_metrics.npy"
+
+
+def load_metrics(tfrecords_filename):
+    return np.load(metric_file(tfrecords_filename), mmap_mode="r")
+
+
 def generate_TFRecord(dir_in, N, output_name):
     tfrecords_filename = os.path.join(dir_in, f"{output_name}.tfrecords")
     writer = tf.io.TFRecordWriter(tfrecords_filename)
@@ -41,8 +51,14 @@ def generate_TFRecord(dir_in, N, output_name):
         os.path.splitext(f)[0]
         for f in os.listdir(os.path.join(dir_in, "signatures"))
     ]
-
-    for fn in names:
+    metrics = np.lib.format.open_memmap(
+        metric_file(tfrecords_filename),
+        mode="w+",
+        dtype=np.float32,
+        shape=(len(names), N, N),
+    )
+
+    for idx, fn in enumerate(names):
         # try:
         s = np.load(os.path.join(dir_in, "signatures", fn + ".npy")).astype(
             np.float32
@@ -54,11 +70,12 @@ def generate_TFRecord(dir_in, N, output_name):
         ).astype(np.float32)
         i = pruneIndices(e.shape[0], N)
         g /= np.mean(g)
+        metrics[idx] = g[i][:, i]
 
         feature = {
             "evecs": _bytes_feature(e[i].tobytes()),
             "evecs_t": _bytes_feature(e_t[:, i].tobytes()),
-            "metric": _bytes_feature(g[i][:, i].tobytes()),
+            "metric_id": _int64_feature(idx),
             "sigs": _bytes_feature(s[i].tobytes()),
             "N_eigs": _int64_feature(e.shape[-1]),
             "N_vert": _int64_feature(N),
@@ -69,6 +86,7 @@ def generate_TFRecord(dir_in, N, output_name):
         writer.write(example.SerializeToString())
 
     writer.close()
+    metrics.flush()
     return
 
 
@@ -21,6 +21,7 @@ def process_directory(data_dir, checkpoint_dir, config, mesh_type):
         config["deep_functional_maps"][k]
         for k in ["learning_rate", "batch_size"]
     ]
+    xla = config["deep_functional_maps"].get("xla", False)
 
     # Data preparation
     generate_TFRecord(data_dir, num_vertices, mesh_type)
@@ -28,7 +29,7 @@ def process_directory(data_dir, checkpoint_dir, config, mesh_type):
     # Training
     fin = os.path.join(data_dir, f"{mesh_type}.tfrecords")
     trainer = ensembleTrainer(
-        tf_record_file=fin, num_sigs=num_signatures, lr=lr, bs=bs
+        tf_record_file=fin, num_sigs=num_signatures, lr=lr, bs=bs, xla=xla
     )
     trainer.train(number_epochs, checkpoint_dir, mesh_type)
 
@@ -6,72 +6,129 @@ with warnings.catch_warnings():
     warnings.filterwarnings("ignore", category=FutureWarning)
     import tensorflow as tf
 
-import itertools
-
 from . import operations as ops
+from .data_loading import load_metrics
 
 """====================================================================================="""
 """                                       Training                                      """
 """====================================================================================="""
 
 
-def pairwise(iterable):
-    # s -> (s0,s1), (s1,s2), (s2, s3), ...
-    a, b = itertools.tee(iterable)
-    next(b, None)
-    return zip(a, b)
+_features = {
+    "evecs": tf.io.FixedLenFeature([], tf.string),
+    "evecs_t": tf.io.FixedLenFeature([], tf.string),
+    "metric_id": tf.io.FixedLenFeature([], tf.int64),
+    "sigs": tf.io.FixedLenFeature([], tf.string),
+    "N_eigs": tf.io.FixedLenFeature([], tf.int64),
+    "N_vert": tf.io.FixedLenFeature([], tf.int64),
+    "N_sigs": tf.io.FixedLenFeature([], tf.int64),
+}
 
 
-def _parse_function(input):
+def _metric_loader(metrics):
+    N_vert = metrics.shape[-1]
 
-    _features = {
-        "evecs": tf.io.FixedLenFeature([], tf.string),
-        "evecs_t": tf.io.FixedLenFeature([], tf.string),
-        "metric": tf.io.FixedLenFeature([], tf.string),
-        "sigs": tf.io.FixedLenFeature([], tf.string),
-        "N_eigs": tf.io.FixedLenFeature([], tf.int64),
-        "N_vert": tf.io.FixedLenFeature([], tf.int64),
-        "N_sigs": tf.io.FixedLenFeature([], tf.int64),
-    }
+    def read(ids):
+        return metrics[ids.numpy()]
 
-    parsed_features = tf.io.parse_single_example(input, features=_features)
+    def load(evecs, evecs_t, sigs, metric_id):
+        metric = tf.py_function(read, [metric_id], tf.float32)
+        metric.set_shape([evecs.shape[0], N_vert, N_vert])
+        return evecs, evecs_t, sigs, metric
 
-    N_eigs = tf.cast(parsed_features["N_eigs"], tf.int32)
-    N_vert = tf.cast(parsed_features["N_vert"], tf.int32)
-    N_sigs = tf.cast(parsed_features["N_sigs"], tf.int32)
+    return load
 
-    evecs = tf.reshape(
-        tf.io.decode_raw(parsed_features["evecs"], tf.float32),
-        [N_vert, N_eigs],
-    )
-    evecs_t = tf.reshape(
-        tf.io.decode_raw(parsed_features["evecs_t"], tf.float32),
-        [N_eigs, N_vert],
-    )
-    metric = tf.reshape(
-        tf.io.decode_raw(parsed_features["metric"], tf.float32),
-        [N_vert, N_vert],
-    )
-    sigs = tf.reshape(
-        tf.io.decode_raw(parsed_features["sigs"], tf.float32), [N_vert, N_sigs]
-    )
 
-    return evecs, evecs_t, sigs, metric
+def _pairwise(dataset):
+    # s -> (s0,s1), (s1,s2), (s2, s3), ...
+    return (
+        dataset.window(2, shift=1, drop_remainder=True)
+        .flat_map(
+            lambda *ts: tf.data.Dataset.zip(tuple(t.batch(2) for t in ts))
+        )
+        .map(lambda *ts: (tuple(t[0] for t in ts), tuple(t[1] for t in ts)))
+    )
 
 
-class ensembleTrainer:
-    def __init__(self, tf_record_file, num_sigs, lr, bs, chkpt_name=None):
+def _record_sizes(tf_record_file):
+    # Every record in a TFRecord shares the same sizes, so they are read once
+    # from the first record. Reshaping with them keeps the parsed tensors'
+    # shapes static when the epoch runs inside a graph.
+    (serialized,) = tf.data.TFRecordDataset(tf_record_file).take(1)
+    parsed_features = tf.io.parse_single_example(serialized, _features)
+    return [
+        int(parsed_features[key]) for key in ["N_eigs", "N_vert", "N_sigs"]
+    ]
+
+
+def _parse_batch(serialized, N_eigs, N_vert, N_sigs):
+    # Parses a whole batch of serialized examples at once.
+    parsed_features = tf.io.parse_example(serialized, features=_features)
+
+    def decode(key, shape):
+        raw = tf.io.decode_raw(parsed_features[key], tf.float32)
+        return tf.reshape(raw, [-1] + shape)
+
+    evecs = decode("evecs", [N_vert, N_eigs])
+    evecs_t = decode("evecs_t", [N_eigs, N_vert])
+    sigs = decode("sigs", [N_vert, N_sigs])
+
+    return evecs, evecs_t, sigs, parsed_features["metric_id"]
+
+
+class ensembleTrainer(tf.keras.Model):
+    def __init__(
+        self,
+        tf_record_file,
+        num_sigs,
+        lr,
+        bs,
+        chkpt_name=None,
+        cache_file="",
+        xla=False,
+        steps_per_execution=16,
+    ):
+        super().__init__()
         cur_dir = os.path.dirname(
             __file__
         )  # TODO: Data needs to be stored outside of python package.
         self.func = ops.residualNet(7, num_sigs, training=True)
-        self.loss = tf.keras.metrics.Mean(name="train_loss")
-        self.optimiser = tf.keras.optimizers.Adam(learning_rate=lr)
-        self.dataset = (
-            tf.data.TFRecordDataset(tf_record_file)
-            .map(_parse_function)
-            .shuffle(buffer_size=128)
+        self.loss_tracker = tf.keras.metrics.Mean(name="loss")
+        # The decoded records are cached after the first epoch (in memory, or
+        # in cache_file if given). Geodesic metrics dominate the size of an
+        # example, so they are left out of the cache and read from their
+        # memory-mapped files after batching, which also keeps them out of
+        # the shuffle buffer.
+        options = tf.data.Options()
+        options.experimental_deterministic = False
+        sizes = _record_sizes(tf_record_file)
+        metrics = load_metrics(tf_record_file)
+        dataset = (
+            tf.data.TFRecordDataset(
+                tf_record_file, num_parallel_reads=tf.data.AUTOTUNE
+            )
             .batch(bs)
+            .map(
+                lambda s: _parse_batch(s, *sizes),
+                num_parallel_calls=tf.data.AUTOTUNE,
+            )
+            .cache(cache_file)
+            .unbatch()
+            .shuffle(buffer_size=128, reshuffle_each_iteration=True)
+            .batch(bs, drop_remainder=True)
+            .map(
+                _metric_loader(metrics),
+                num_parallel_calls=tf.data.AUTOTUNE,
+            )
+        )
+        # Declaring the number of pairs lets fit truncate the last
+        # steps_per_execution chunk of an epoch instead of running out of data.
+        num_pairs = metrics.shape[0] // bs - 1
+        self.dataset = (
+            _pairwise(dataset)
+            .apply(tf.data.experimental.assert_cardinality(num_pairs))
+            .prefetch(tf.data.AUTOTUNE)
+            .with_options(options)
         )
 
         current_time = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
@@ -83,36 +140,57 @@ class ensembleTrainer:
             self.func.load_weights(weight_path)
             print("Weights loaded.")
 
-    @tf.function
-    def train_step(self, x, y):
+        # With xla=True the correspondence, soft-correspondence and geodesic
+        # error ops are fused into fewer kernels. It is off by default as not
+        # every device and TensorFlow build supports XLA compilation.
+        self.pair_loss = tf.function(
+            self._pair_loss,
+            experimental_compile=xla,
+            experimental_relax_shapes=True,
+        )
+        self.compile(
+            optimizer=tf.keras.optimizers.Adam(learning_rate=lr),
+            steps_per_execution=steps_per_execution,
+        )
+
+    @property
+    def metrics(self):
+        # Listed here so that fit resets the tracker at the start of each epoch
+        return [self.loss_tracker]
+
+    def call(self, x):
+        return self.func(x)
+
+    def _pair_loss(self, x, y):
         e_x, et_x, s_x, g_x = x
         e_y, et_y, s_y, g_y = y
+        sigs = [self.func(x) for x in (s_x, s_y)]
+        C = ops.correspondenceMatrix(sigs, [et_x, et_y])
+        P = ops.softCorrespondenceEnsemble(C, et_x, e_y)
+        return ops.geodesicErrorEnsemble(P, g_x, g_y)
+
+    def train_step(self, data):
+        x, y = data
         with tf.GradientTape() as tape:
-            sigs = [self.func(x) for x in (s_x, s_y)]
-            C = ops.correspondenceMatrix(sigs, [et_x, et_y])
-            P = ops.softCorrespondenceEnsemble(C, et_x, e_y)
-            loss = ops.geodesicErrorEnsemble(P, g_x, g_y)
-            grads = tape.gradient(loss, self.func.trainable_variables)
-            self.optimiser.apply_gradients(
-                zip(grads, self.func.trainable_variables)
-            )
-        self.loss(loss)
+            loss = self.pair_loss(x, y)
+        grads = tape.gradient(loss, self.func.trainable_variables)
+        self.optimizer.apply_gradients(
+            zip(grads, self.func.trainable_variables)
+        )
+        self.loss_tracker.update_state(loss)
+        return {"loss": self.loss_tracker.result()}
 
     def train(self, number_epochs, checkpoint_dir, chkpt_name):
         best = -1
         print_interval = int(number_epochs / 10)
-        for epoch in range(number_epochs):
-            for x, y in pairwise(self.dataset):
-                try:
-                    self.train_step(x, y)
-                except Exception as e:
-                    print(f"Error caught: {e}")
-            epoch_loss = self.loss.result()
+
+        def on_epoch_end(epoch, logs):
+            nonlocal best
+            epoch_loss = logs["loss"]
             if epoch % print_interval == 0:
                 print("Epoch {}, Loss: {}".format(epoch + 1, 100 * epoch_loss))
             with self.summary_writer.as_default():
                 tf.summary.scalar("loss", epoch_loss, step=epoch)
-            self.loss.reset_states()
 
             if epoch == 1:
                 best = epoch_loss
@@ -120,3 +198,12 @@ class ensembleTrainer:
                 fout = os.path.join(checkpoint_dir, chkpt_name)
                 self.func.save_weights(fout)
                 best = epoch_loss
+
+        self.fit(
+            self.dataset,
+            epochs=number_epochs,
+            verbose=0,
+            callbacks=[
+                tf.keras.callbacks.LambdaCallback(on_epoch_end=on_epoch_end)
+            ],
+        )
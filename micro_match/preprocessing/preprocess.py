@@ -79,7 +79,7 @@ def batch_preprocess(dir_in, dir_out, config):
         try:
             mesh = loader(fn)
             evals, evecs = mesh.eigen
-            evecs_t = np.transpose(mesh.mass @ evecs)
+            evecs_t = mesh.evecs_t
             sizes.append(mesh.num_vertices())
             minima.append(1e-2 + evals[0 < evals].min())
             maxima.append(evals.max())
@@ -107,7 +107,9 @@ def laplace_beltrami_operator(l, m):
 def laplace_eigen_decomposition(
     l: np.array, m: np.array, k: int
 ) -> List[np.array]:
-    evals, evecs = eigsh(A=-l, k=k, M=m, which="SM")
+    # Shift-invert about a small negative sigma so ARPACK converges quickly
+    # on the smallest eigenvalues (-l - sigma * m is positive definite).
+    evals, evecs = eigsh(A=-l, k=k, M=m, sigma=-1e-5, which="LM")
     evecs /= np.sqrt(np.sum(m.dot(evecs ** 2), axis=0, keepdims=True))
     return [evals, evecs]
 
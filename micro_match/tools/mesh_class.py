@@ -30,6 +30,7 @@ class Mesh:
         self.__mass = np.array([])
         self.__normals = np.array([])
         self.__eigen = [np.array([]) for _ in range(2)]
+        self.__mass_evecs = np.array([])  # Mass weighted eigenvectors
         self.__scalars = {}
         self.__type = type
         self.__name = ""
@@ -47,7 +48,11 @@ class Mesh:
             v = self.v[idx]
             f = np.array([])
 
-        g = np.array([]) if (self.__g.size == 0) else self.g[idx][:, idx]
+        g = (
+            np.array([])
+            if (self.__g.size == 0)
+            else self.__g[np.ix_(idx, idx)]
+        )
         res = Mesh(
             v,
             f,
@@ -145,6 +150,7 @@ class Mesh:
 
     @num_eigenvectors.setter
     def num_eigenvectors(self, k):
+        self.__mass_evecs = np.array([])
         self.__eigen = (
             [e[..., :k] for e in self.__eigen]
             if (k <= self.__num_eigenvectors)
@@ -201,6 +207,7 @@ class Mesh:
 
     @eigen.setter
     def eigen(self, eigen):
+        self.__mass_evecs = np.array([])
         self.__num_eigenvectors = eigen[0].size
         self.__eigen = eigen
 
@@ -214,8 +221,21 @@ class Mesh:
 
     @mass.setter
     def mass(self, mass):
+        self.__mass_evecs = np.array([])
         self.__mass = mass
 
+    # Cached and shared by the scalar conversions, so returned read-only.
+    @property
+    def mass_evecs(self):
+        if self.__mass_evecs.size == 0:
+            self.__mass_evecs = self.mass @ self.eigen[-1]
+            self.__mass_evecs.flags.writeable = False
+        return self.__mass_evecs
+
+    @property
+    def evecs_t(self):
+        return self.mass_evecs.T
+
     # Laplacian
     @property
     def l(self):
@@ -233,7 +253,7 @@ class Mesh:
     """ ================================================ """
 
     def pointwise_2_vector(self, scalar, k=-1):
-        evecs = self.mass @ self.eigen[-1]
+        evecs = self.mass_evecs
         if 0 < k:
             evecs = evecs[:, :k]
         return evecs.T @ scalar
@@ -248,14 +268,20 @@ class Mesh:
         return self.vector_2_pointwise(s)
 
     def filter_array(self, array, k=-1):
-        array = self.filter(array, k=k)
-        return self.filter(array.T, k=k).T
+        # Equivalent to filtering both sides of the array: V (MV)^T A MV V^T
+        evecs, mass_evecs = self.eigen[-1], self.mass_evecs
+        if 0 < k:
+            evecs, mass_evecs = evecs[:, :k], mass_evecs[:, :k]
+        return np.linalg.multi_dot(
+            [evecs, mass_evecs.T, array, mass_evecs, evecs.T]
+        )
 
     def dirac_deltas(self, i, k=-1):
-        x = np.zeros((self.num_vertices(), i.size))
-        j = np.arange(i.size)
-        x[i, j] = 1
-        return self.pointwise_2_vector(x, k)
+        # Projecting a delta at vertex i just selects row i of mass @ evecs.
+        evecs = self.mass_evecs
+        if 0 < k:
+            evecs = evecs[:, :k]
+        return evecs[i].T
 
     """ ================================================ """
     """                    Resampling                    """
@@ -266,10 +292,12 @@ class Mesh:
         _, v, f, _, idx = util.vedo_decimate(
             v, f, N=N, frac=frac
         )  # igl.decimate(self.v, self.f, target)
+        # Only slice an existing geodesic matrix; if there is none, it is
+        # computed lazily on the (smaller) decimated mesh when needed.
         geodesic_matrix = (
             np.array([])
             if (self.__g.size == 0)
-            else self.g[idx][:, idx].copy()
+            else self.__g[np.ix_(idx, idx)]
         )
         res = Mesh(
             v,